@@ -4,11 +4,15 @@ PostgreSQL Backup Script
 This script connects to a PostgreSQL database and performs automated backups.
 """
 
+import io
 import os
 import sys
-import gzip
 import shutil
+import tempfile
+import threading
 import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -16,13 +20,27 @@ from dotenv import load_dotenv
 from config import get_config
 from logger import logger
 from database import connect_with_retry, verify_backup
-from storage import ensure_backup_dir, cleanup_old_backups, upload_to_remote
-from checksum import generate_checksum
+from storage import (
+    ensure_backup_dir, cleanup_old_backups, upload_to_remote,
+    upload_stream_to_remote, delete_from_remote, remote_prefix,
+)
+from checksum import CHECKSUM_EXTENSIONS, HashingWriter, format_checksum, write_checksum
+from compression import COMPRESSION_EXTENSIONS, COPY_BUFFER_SIZE, check_archive, compress_stream
 from notification import send_discord_notification
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Number of trailing stderr lines kept for error messages
+STDERR_TAIL_LINES = 20
+
+# Archive extension (before compression suffix) for each pg_dump output format
+DUMP_EXTENSIONS = {
+    'plain': '.sql',
+    'directory': '.tar',
+    'custom': '.dump',
+}
+
 
 def main():
     """Main entry point."""
@@ -36,54 +54,36 @@ def main():
     try:
         # Load configuration
         config = get_config()
-        logger.info(f"Backup directory: {config['backup_dir']}")
-        
-        # Test database connection with retry
-        if not connect_with_retry(config):
-            logger.error("Database connection failed after all retries. Exiting.")
-            _send_failure_notification(config, "Connection failed after all retries", "Database connection")
-            sys.exit(1)
+        logger.info(f"Backup directory: {config.backup_dir}")
         
-        logger.info("Database connection successful!")
+        # Test database connection with retry (pg_dump reports connection
+        # errors itself, so short-lived runs may skip the extra handshake)
+        if config.preflight_check:
+            if not connect_with_retry(config):
+                logger.error("Database connection failed after all retries. Exiting.")
+                _send_failure_notification(config, "Connection failed after all retries", "Database connection")
+                sys.exit(1)
+            
+            logger.info("Database connection successful!")
         
         # Ensure backup directory exists
-        ensure_backup_dir(config['backup_dir'])
+        ensure_backup_dir(config.backup_dir)
         
         # Generate backup filename
-        backup_file = generate_backup_filename(config['backup_dir'])
-        
-        # Run pg_dump
-        run_pg_dump(config, backup_file)
-        
-        # Compress backup
-        final_file = compress_backup(backup_file)
-        
-        # Generate SHA256 checksum
-        checksum_file = generate_checksum(final_file)
-        
-        # Show final file info
-        file_size = os.path.getsize(final_file)
-        logger.info(f"Backup completed: {final_file} ({file_size / 1024:.1f} KB)")
-        
-        # Upload to remote if enabled
-        target = config['backup_target']
-        if target in ['remote', 'all']:
-            upload_to_remote(final_file, config)
-            upload_to_remote(checksum_file, config)
+        extension = DUMP_EXTENSIONS.get(config.pg_dump_format, '.sql')
+        # Custom-format archives are compressed by pg_dump itself
+        if config.pg_dump_format != 'custom':
+            extension += COMPRESSION_EXTENSIONS.get(config.compression, '.gz')
+        # start_time is reused so filename and remote prefix always agree
+        final_file = generate_backup_filename(config.backup_dir, extension, start_time)
+        prefix = remote_prefix(config, start_time)
         
-        # Cleanup old backups (only if keeping local)
-        if target in ['local', 'all']:
-            cleanup_old_backups(config['backup_dir'], config['retention_days'])
-        
-        # Verify backup if enabled (before deleting local file)
-        if config['verify_enabled']:
-            verify_backup(final_file, config)
-        
-        # Delete local files if remote-only mode
-        if target == 'remote':
-            os.remove(final_file)
-            os.remove(checksum_file)
-            logger.info(f"Removed local files (remote-only mode)")
+        target = config.backup_target
+        if target == 'remote' and not config.verify_enabled:
+            # Nothing needs a local copy: stream the archive straight to remote
+            file_size = stream_to_remote(config, final_file, prefix)
+        else:
+            file_size = backup_to_local_file(config, final_file, prefix)
         
         # Send success notification
         duration = (datetime.now() - start_time).total_seconds()
@@ -96,9 +96,104 @@ def main():
         sys.exit(1)
 
 
+def backup_to_local_file(config, final_file, prefix):
+    """Dump to a local archive, then upload, verify and clean up as configured.
+    
+    Returns the archive size in bytes.
+    """
+    target = config.backup_target
+    
+    algo = config.checksum_algo
+    
+    # Run pg_dump, compressing and hashing its output on the fly
+    checksum = run_pg_dump(config, final_file)
+    local_files = [final_file]
+    
+    # Save the checksum computed during the dump
+    if checksum:
+        local_files.append(write_checksum(final_file, checksum, algo))
+    
+    # Show final file info
+    file_size = os.path.getsize(final_file)
+    logger.info(f"Backup completed: {final_file} ({file_size / 1024:.1f} KB)")
+    
+    # Upload (network-bound) and verify (disk/CPU-bound) run concurrently
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = []
+        if target in ['remote', 'all']:
+            for path in local_files:
+                futures.append(executor.submit(upload_to_remote, path, config, prefix))
+        
+        # Without SHA256, rely on the compressor's own CRC32 / xxhash64 footer
+        # (custom-format archives compress per table and have no outer footer)
+        if algo != 'sha256' and config.pg_dump_format != 'custom':
+            futures.append(executor.submit(check_archive, final_file, config))
+        
+        # Verify backup if enabled (before deleting local file)
+        if config.verify_enabled:
+            futures.append(executor.submit(verify_backup, final_file, config))
+        
+        # Cleanup old backups (only if keeping local)
+        if target in ['local', 'all']:
+            cleanup_old_backups(config.backup_dir, config.retention_days,
+                                config.async_cleanup, config.parallel_cleanup)
+        
+        for future in futures:
+            future.result()
+    
+    # Delete local files if remote-only mode
+    if target == 'remote':
+        for path in local_files:
+            os.remove(path)
+        logger.info(f"Removed local files (remote-only mode)")
+    
+    return file_size
+
+
+def stream_to_remote(config, final_file, prefix):
+    """Dump and upload the compressed stream without writing a local archive.
+    
+    The compressed bytes go through an OS pipe from a worker thread straight
+    into a multipart upload. Returns the uploaded archive size in bytes.
+    """
+    filename = os.path.basename(final_file)
+    read_fd, write_fd = os.pipe()
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Closing the read end on upload failure makes the dump thread fail
+        # with a broken pipe instead of blocking forever
+        with open(read_fd, 'rb') as reader:
+            dump = executor.submit(_dump_to_pipe, config, write_fd, filename)
+            upload_stream_to_remote(reader, filename, config, prefix)
+        
+        try:
+            sink = dump.result()
+        except Exception:
+            # The upload saw EOF early and stored a truncated archive
+            delete_from_remote(filename, config, prefix)
+            raise
+    
+    checksum = sink.hexdigest()
+    if checksum:
+        checksum_line = format_checksum(checksum, filename).encode()
+        checksum_name = filename + CHECKSUM_EXTENSIONS[config.checksum_algo]
+        upload_stream_to_remote(io.BytesIO(checksum_line), checksum_name, config, prefix)
+    
+    logger.info(f"Backup streamed to remote: {filename} ({sink.size / 1024:.1f} KB)")
+    return sink.size
+
+
+def _dump_to_pipe(config, write_fd, archive_name):
+    """Write the compressed dump into the write end of a pipe."""
+    # Same large buffer as the local file: small compressor writes are
+    # coalesced before they hit the pipe
+    with open(write_fd, 'wb', buffering=COPY_BUFFER_SIZE) as pipe:
+        return dump_to_stream(config, pipe, archive_name)
+
+
 def _send_success_notification(config, filename, file_size, storage, duration):
     """Send Discord notification for successful backup."""
-    if not config.get('discord_notify_success'):
+    if not config.discord_notify_success:
         return
     
     # Format file size
@@ -117,9 +212,9 @@ def _send_success_notification(config, filename, file_size, storage, duration):
     storage_str = storage_map.get(storage, storage)
     
     send_discord_notification(
-        webhook_url=config.get('discord_webhook_url', ''),
+        webhook_url=config.discord_webhook_url,
         success=True,
-        database=config['database'],
+        database=config.database,
         filename=os.path.basename(filename) if filename else None,
         file_size=size_str,
         storage=storage_str,
@@ -129,67 +224,164 @@ def _send_success_notification(config, filename, file_size, storage, duration):
 
 def _send_failure_notification(config, error_message, error_step):
     """Send Discord notification for failed backup."""
-    if not config.get('discord_notify_failure'):
+    if not config.discord_notify_failure:
         return
     
     send_discord_notification(
-        webhook_url=config.get('discord_webhook_url', ''),
+        webhook_url=config.discord_webhook_url,
         success=False,
-        database=config.get('database', 'unknown'),
+        database=config.database,
         error_message=error_message,
         error_step=error_step,
     )
 
 
-def generate_backup_filename(backup_dir):
+def generate_backup_filename(backup_dir, extension='.sql.gz', now=None):
     """Generate backup filename with timestamp."""
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    filename = f"backup_{timestamp}.sql"
+    timestamp = (now or datetime.now()).strftime('%Y-%m-%d_%H-%M-%S')
+    filename = f"backup_{timestamp}{extension}"
     return os.path.join(backup_dir, filename)
 
 
 def run_pg_dump(config, output_file):
-    """Run pg_dump to create backup file."""
+    """Run pg_dump and stream its output through compression into output_file.
+    
+    Returns the hex digest of the written archive (None for CHECKSUM_ALGO=none).
+    """
+    try:
+        with open(output_file, 'wb', buffering=COPY_BUFFER_SIZE) as f_out:
+            sink = dump_to_stream(config, f_out, os.path.basename(output_file))
+    except Exception:
+        # Don't leave a truncated archive behind
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    
+    logger.info(f"Backup created: {output_file}")
+    return sink.hexdigest()
+
+
+def dump_to_stream(config, dest, archive_name):
+    """Run pg_dump and write its compressed output to the file object dest.
+    
+    Returns the HashingWriter wrapped around dest, which holds the checksum
+    and size of the written archive.
+    """
     env = os.environ.copy()
-    env['PGPASSWORD'] = config['password']
+    env['PGPASSWORD'] = config.password
     
     cmd = [
         'pg_dump',
-        '-h', config['host'],
-        '-p', config['port'],
-        '-U', config['user'],
-        '-d', config['database'],
-        '-f', output_file
+        '-h', config.host,
+        '-p', config.port,
+        '-U', config.user,
+        '-d', config.database,
     ]
+    sink = HashingWriter(dest, config.checksum_algo)
     
     try:
         logger.info("Running pg_dump...")
-        subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
-        logger.info(f"Backup created: {output_file}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"pg_dump failed: {e.stderr}")
-        raise
-    except FileNotFoundError:
-        logger.error("pg_dump not found. Please install PostgreSQL client tools.")
+        if config.pg_dump_format == 'directory':
+            _dump_directory(cmd, env, sink, config, archive_name.split('.')[0])
+        elif config.pg_dump_format == 'custom':
+            _dump_custom(cmd, env, sink, config)
+        else:
+            # No -f: pg_dump writes to stdout so no uncompressed .sql touches disk
+            _pipe_through_compression(cmd, env, sink, config)
+    except FileNotFoundError as e:
+        logger.error(f"{e.filename} not found. Please install PostgreSQL client tools.")
         raise
+    
+    return sink
 
 
-def compress_backup(backup_file):
-    """Compress backup file with gzip."""
-    compressed_file = backup_file + '.gz'
+def _dump_directory(cmd, env, sink, config, name):
+    """Dump tables in parallel with pg_dump's directory format, then tar it.
+    
+    The directory is staged inside the backup directory and removed afterwards.
+    """
+    jobs = config.pg_dump_jobs
+    staging_dir = tempfile.mkdtemp(prefix='.pg_dump_', dir=config.backup_dir)
     
     try:
-        logger.info("Compressing backup with gzip...")
-        with open(backup_file, 'rb') as f_in:
-            with gzip.open(compressed_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+        logger.info(f"Dumping with directory format ({jobs} jobs)...")
+        # -Z 0: the tar stream is compressed as a whole afterwards
+        dump_cmd = cmd + ['-F', 'd', '-j', str(jobs), '-Z', '0', '-f', os.path.join(staging_dir, name)]
+        proc = subprocess.Popen(dump_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        reader, tail = _log_stderr(proc)
+        proc.wait()
+        reader.join()
+        if proc.returncode != 0:
+            stderr = '\n'.join(tail)
+            logger.error(f"pg_dump failed: {stderr}")
+            raise subprocess.CalledProcessError(proc.returncode, dump_cmd, stderr=stderr)
         
-        # Remove original .sql file
-        os.remove(backup_file)
-        return compressed_file
-    except OSError as e:
-        logger.error(f"Failed to compress backup: {e}")
-        raise
+        tar_cmd = ['tar', '-cf', '-', '-C', staging_dir, name]
+        _pipe_through_compression(tar_cmd, env, sink, config)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _dump_custom(cmd, env, sink, config):
+    """Dump with pg_dump's custom format, compressed by pg_dump itself.
+    
+    The archive is restorable with 'pg_restore -j N'. zstd needs pg_dump 16+.
+    """
+    if config.compression == 'zstd':
+        level = f"zstd:{config.zstd_level}"
+    else:
+        level = str(config.gzip_level)
+    
+    logger.info(f"Dumping with custom format (-Z {level})...")
+    _pipe_through_compression(cmd + ['-F', 'c', '-Z', level], env, sink, config, compress=False)
+
+
+def _pipe_through_compression(cmd, env, sink, config, compress=True):
+    """Pipe the stdout of cmd through compression into sink.
+    
+    With compress=False the output is copied as is (already compressed).
+    """
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader, tail = _log_stderr(proc)
+    
+    try:
+        if compress:
+            compress_stream(proc.stdout, sink, config)
+        else:
+            shutil.copyfileobj(proc.stdout, sink, COPY_BUFFER_SIZE)
+    finally:
+        # Close our end so the producer gets SIGPIPE if compression failed
+        proc.stdout.close()
+        proc.wait()
+        reader.join()
+    
+    if proc.returncode != 0:
+        stderr = '\n'.join(tail)
+        logger.error(f"{cmd[0]} failed: {stderr}")
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+
+def _log_stderr(proc):
+    """Log the stderr of proc line by line from a background thread.
+    
+    Draining stderr while stdout is being consumed keeps a chatty process
+    from blocking on a full pipe. Returns the thread and a deque holding
+    the last lines for error reporting.
+    """
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    
+    def _drain():
+        with proc.stderr:
+            for raw in proc.stderr:
+                line = raw.decode(errors='replace').rstrip()
+                if line:
+                    tail.append(line)
+                    # pg_dump prefixes its own lines with "pg_dump:"
+                    logger.info(line)
+    
+    thread = threading.Thread(target=_drain, daemon=True)
+    thread.start()
+    return thread, tail
 
 
 if __name__ == '__main__':
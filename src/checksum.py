@@ -1,7 +1,7 @@
 """
 Checksum module for PostgreSQL backup job.
 
-Generates SHA256 checksums for backup integrity verification.
+Generates SHA256 (or xxHash64) checksums for backup integrity verification.
 """
 
 import os
@@ -10,25 +10,79 @@ import hashlib
 from logger import logger
 
 
-def generate_checksum(file_path):
-    """Generate SHA256 checksum for a file and save to .sha256 file."""
-    sha256_hash = hashlib.sha256()
+# Sidecar file extension for each CHECKSUM_ALGO setting ('none' writes no sidecar)
+CHECKSUM_EXTENSIONS = {
+    'sha256': '.sha256',
+    'xxh64': '.xxh64',
+}
+
+
+def new_hash(algo):
+    """Return a hash object for a CHECKSUM_ALGO setting, or None for 'none'.
+    
+    Raises ValueError for an unknown algorithm, before anything is dumped.
+    """
+    if algo == 'none':
+        return None
+    
+    if algo not in CHECKSUM_EXTENSIONS:
+        raise ValueError(f"Unknown CHECKSUM_ALGO: {algo!r} (expected one of: {', '.join(CHECKSUM_EXTENSIONS)}, none)")
+    
+    if algo == 'xxh64':
+        try:
+            import xxhash
+        except ImportError:
+            logger.error("CHECKSUM_ALGO=xxh64 requires the 'xxhash' package")
+            raise
+        return xxhash.xxh64()
+    
+    return hashlib.sha256()
+
+
+class HashingWriter:
+    """File-like wrapper that hashes bytes as they are written.
+    
+    Lets the checksum be computed while the archive is produced instead of
+    re-reading the finished file from disk. With algo='none' it only
+    counts bytes and hexdigest() returns None.
+    """
+    
+    def __init__(self, fileobj, algo='sha256'):
+        self._fileobj = fileobj
+        self._hash = new_hash(algo)
+        self.size = 0
+    
+    def write(self, data):
+        if self._hash is not None:
+            self._hash.update(data)
+        self.size += len(data)
+        return self._fileobj.write(data)
+    
+    def flush(self):
+        self._fileobj.flush()
+    
+    def hexdigest(self):
+        if self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+
+def format_checksum(checksum, filename):
+    """Return a checksum line in standard sha256sum format: "hash  filename"."""
+    return f"{checksum}  {filename}\n"
+
+
+def write_checksum(file_path, checksum, algo='sha256'):
+    """Save an already computed checksum to <file_path>.sha256 (or .xxh64)."""
+    checksum_file = file_path + CHECKSUM_EXTENSIONS[algo]
+    filename = os.path.basename(file_path)
     
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                sha256_hash.update(chunk)
-        
-        checksum = sha256_hash.hexdigest()
-        checksum_file = file_path + '.sha256'
-        filename = os.path.basename(file_path)
-        
-        # Write checksum in standard format: "hash  filename"
         with open(checksum_file, 'w') as f:
-            f.write(f"{checksum}  {filename}\n")
-        
-        logger.info(f"Checksum generated: {checksum[:16]}...")
-        return checksum_file
+            f.write(format_checksum(checksum, filename))
     except OSError as e:
-        logger.error(f"Failed to generate checksum: {e}")
+        logger.error(f"Failed to write checksum: {e}")
         raise
+    
+    logger.info(f"Checksum generated: {checksum[:16]}...")
+    return checksum_file
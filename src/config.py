@@ -5,44 +5,124 @@ Reads configuration from environment variables.
 """
 
 import os
+import functools
+from dataclasses import dataclass
 
 
+@dataclass(frozen=True, slots=True)
+class BackupConfig:
+    """Backup job settings, parsed once from the environment."""
+    
+    # Database connection
+    host: str
+    port: str
+    user: str
+    password: str
+    database: str
+    
+    # Backup settings
+    backup_dir: str
+    preflight_check: bool
+    retry_count: int
+    retry_delay: int
+    retry_max_delay: int
+    retention_days: int
+    async_cleanup: bool
+    parallel_cleanup: bool
+    pg_dump_format: str
+    pg_dump_jobs: int
+    compression: str
+    gzip_level: int
+    zstd_level: int
+    pigz_threads: int
+    checksum_algo: str
+    
+    # Verify configuration
+    verify_enabled: bool
+    verify_host: str
+    verify_port: str
+    verify_user: str
+    verify_password: str
+    verify_db: str
+    
+    # Storage configuration
+    backup_target: str
+    remote_endpoint: str
+    remote_bucket: str
+    remote_access_key: str
+    remote_secret_key: str
+    remote_region: str
+    remote_path_format: str
+    s3_concurrency: int
+    
+    # Discord notification
+    discord_webhook_url: str
+    discord_notify_success: bool
+    discord_notify_failure: bool
+
+
+@functools.lru_cache(maxsize=1)
 def get_config():
-    """Read configuration from environment variables."""
-    config = {
+    """Read configuration from environment variables.
+    
+    Parsed once per process; call get_config.cache_clear() after changing
+    the environment. Raises ValueError for an unknown value of an
+    enumerated setting (e.g. COMPRESSION), before any work is done.
+    """
+    env = os.environ
+    return BackupConfig(
         # Database connection
-        'host': os.environ.get('POSTGRES_HOST', 'localhost'),
-        'port': os.environ.get('POSTGRES_PORT', '5432'),
-        'user': os.environ.get('POSTGRES_USER', 'backup_user'),
-        'password': os.environ.get('POSTGRES_PASSWORD', 'backup_password'),
-        'database': os.environ.get('POSTGRES_DB', 'testdb'),
+        host=env.get('POSTGRES_HOST', 'localhost'),
+        port=env.get('POSTGRES_PORT', '5432'),
+        user=env.get('POSTGRES_USER', 'backup_user'),
+        password=env.get('POSTGRES_PASSWORD', 'backup_password'),
+        database=env.get('POSTGRES_DB', 'testdb'),
         
         # Backup settings
-        'backup_dir': os.environ.get('BACKUP_DIR', './backups'),
-        'retry_count': int(os.environ.get('RETRY_COUNT', '3')),
-        'retry_delay': int(os.environ.get('RETRY_DELAY', '5')),
-        'retention_days': int(os.environ.get('RETENTION_DAYS', '7')),
+        backup_dir=env.get('BACKUP_DIR', './backups'),
+        preflight_check=env.get('PREFLIGHT_CHECK', 'true').lower() == 'true',
+        retry_count=int(env.get('RETRY_COUNT', '3')),
+        retry_delay=int(env.get('RETRY_DELAY', '5')),  # base of the exponential backoff
+        retry_max_delay=int(env.get('RETRY_MAX_DELAY', '60')),
+        retention_days=int(env.get('RETENTION_DAYS', '7')),
+        async_cleanup=env.get('ASYNC_CLEANUP', 'false').lower() == 'true',
+        parallel_cleanup=env.get('PARALLEL_CLEANUP', 'false').lower() == 'true',
+        pg_dump_format=_choice(env, 'PG_DUMP_FORMAT', 'plain', ('plain', 'directory', 'custom')),
+        pg_dump_jobs=int(env.get('PG_DUMP_JOBS', '4')),
+        compression=_choice(env, 'COMPRESSION', 'gzip', ('gzip', 'zstd')),
+        gzip_level=int(env.get('GZIP_LEVEL', '1')),
+        zstd_level=int(env.get('ZSTD_LEVEL', '3')),
+        pigz_threads=int(env.get('PIGZ_THREADS', '0')),  # 0 = all cores
+        checksum_algo=_choice(env, 'CHECKSUM_ALGO', 'sha256', ('sha256', 'xxh64', 'none')),
         
         # Verify configuration
-        'verify_enabled': os.environ.get('VERIFY_ENABLED', 'false').lower() == 'true',
-        'verify_host': os.environ.get('VERIFY_HOST', os.environ.get('POSTGRES_HOST', 'localhost')),
-        'verify_port': os.environ.get('VERIFY_PORT', os.environ.get('POSTGRES_PORT', '5432')),
-        'verify_user': os.environ.get('VERIFY_USER', os.environ.get('POSTGRES_USER', 'backup_user')),
-        'verify_password': os.environ.get('VERIFY_PASSWORD', os.environ.get('POSTGRES_PASSWORD', 'backup_password')),
-        'verify_db': os.environ.get('VERIFY_DB', 'testdb_verify'),
+        verify_enabled=env.get('VERIFY_ENABLED', 'false').lower() == 'true',
+        verify_host=env.get('VERIFY_HOST') or env.get('POSTGRES_HOST', 'localhost'),
+        verify_port=env.get('VERIFY_PORT') or env.get('POSTGRES_PORT', '5432'),
+        verify_user=env.get('VERIFY_USER') or env.get('POSTGRES_USER', 'backup_user'),
+        verify_password=env.get('VERIFY_PASSWORD') or env.get('POSTGRES_PASSWORD', 'backup_password'),
+        verify_db=env.get('VERIFY_DB', 'testdb_verify'),
         
         # Storage configuration
-        'backup_target': os.environ.get('BACKUP_TARGET', 'local'),  # local | remote | all
-        'remote_endpoint': os.environ.get('REMOTE_ENDPOINT', 'http://localhost:9000'),
-        'remote_bucket': os.environ.get('REMOTE_BUCKET', 'test-backup'),
-        'remote_access_key': os.environ.get('REMOTE_ACCESS_KEY', 'minioadmin'),
-        'remote_secret_key': os.environ.get('REMOTE_SECRET_KEY', 'minioadmin'),
-        'remote_region': os.environ.get('REMOTE_REGION', 'us-east-1'),
-        'remote_path_format': os.environ.get('REMOTE_PATH_FORMAT', 'monthly'),  # flat | monthly | daily
+        backup_target=_choice(env, 'BACKUP_TARGET', 'local', ('local', 'remote', 'all')),
+        remote_endpoint=env.get('REMOTE_ENDPOINT', 'http://localhost:9000'),
+        remote_bucket=env.get('REMOTE_BUCKET', 'test-backup'),
+        remote_access_key=env.get('REMOTE_ACCESS_KEY', 'minioadmin'),
+        remote_secret_key=env.get('REMOTE_SECRET_KEY', 'minioadmin'),
+        remote_region=env.get('REMOTE_REGION', 'us-east-1'),
+        remote_path_format=_choice(env, 'REMOTE_PATH_FORMAT', 'monthly', ('flat', 'monthly', 'daily')),
+        s3_concurrency=int(env.get('S3_CONCURRENCY', '16')),
         
         # Discord notification
-        'discord_webhook_url': os.environ.get('DISCORD_WEBHOOK_URL', ''),
-        'discord_notify_success': os.environ.get('DISCORD_NOTIFY_SUCCESS', 'true').lower() == 'true',
-        'discord_notify_failure': os.environ.get('DISCORD_NOTIFY_FAILURE', 'true').lower() == 'true',
-    }
-    return config
+        discord_webhook_url=env.get('DISCORD_WEBHOOK_URL', ''),
+        discord_notify_success=env.get('DISCORD_NOTIFY_SUCCESS', 'true').lower() == 'true',
+        discord_notify_failure=env.get('DISCORD_NOTIFY_FAILURE', 'true').lower() == 'true',
+    )
+
+
+def _choice(env, name, default, choices):
+    """Read an enumerated setting, rejecting values outside choices."""
+    value = env.get(name, default)
+    if value not in choices:
+        raise ValueError(f"Invalid {name}: {value!r} (expected one of: {', '.join(choices)})")
+    return value
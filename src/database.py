@@ -6,25 +6,44 @@ Handles database connections and verification.
 
 import os
 import time
+import random
+import shutil
+import tempfile
 import subprocess
+from dataclasses import replace
 
 import psycopg2
+from psycopg2 import sql
 
 from logger import logger
 
 
+# Archives produced by the directory dump format
+DIRECTORY_ARCHIVE_EXTENSIONS = ('.tar.gz', '.tar.zst')
+
+# Archives produced by the custom dump format (compressed by pg_dump)
+CUSTOM_ARCHIVE_EXTENSION = '.dump'
+
+
+# Seconds to wait for the preflight probe before treating the host as down
+CONNECT_TIMEOUT = 5
+
+
 def check_connection(config):
     """Test connection to PostgreSQL database."""
     try:
         conn = psycopg2.connect(
-            host=config['host'],
-            port=config['port'],
-            user=config['user'],
-            password=config['password'],
-            dbname=config['database']
+            host=config.host,
+            port=config.port,
+            user=config.user,
+            password=config.password,
+            dbname=config.database,
+            connect_timeout=CONNECT_TIMEOUT,
+            keepalives=1,
+            keepalives_idle=30
         )
         conn.close()
-        logger.info(f"Connected to {config['database']}@{config['host']}:{config['port']}")
+        logger.info(f"Connected to {config.database}@{config.host}:{config.port}")
         return True
     except psycopg2.Error as e:
         logger.warning(f"Connection attempt failed: {e}")
@@ -33,35 +52,45 @@ def check_connection(config):
 
 def connect_with_retry(config):
     """Try to connect to database with retry logic."""
-    retry_count = config['retry_count']
-    retry_delay = config['retry_delay']
+    retry_count = config.retry_count
     
     for attempt in range(1, retry_count + 1):
         if check_connection(config):
             return True
         
         if attempt < retry_count:
-            logger.warning(f"Retrying in {retry_delay} seconds... ({attempt}/{retry_count})")
-            time.sleep(retry_delay)
+            delay = _backoff_delay(attempt, config.retry_delay, config.retry_max_delay)
+            logger.warning(f"Retrying in {delay:.1f} seconds... ({attempt}/{retry_count})")
+            time.sleep(delay)
     
     return False
 
 
+def _backoff_delay(attempt, base, cap):
+    """Exponential backoff with jitter: base * 2^(attempt-1) +/- 50%, capped."""
+    return min(cap, base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
 def verify_backup(backup_file, config):
     """Verify backup by restoring to a temporary database."""
     logger.info("Verifying backup...")
     
-    verify_config = {
-        'host': config['verify_host'],
-        'port': config['verify_port'],
-        'user': config['verify_user'],
-        'password': config['verify_password'],
-        'database': config['verify_db']
-    }
+    verify_config = replace(
+        config,
+        host=config.verify_host,
+        port=config.verify_port,
+        user=config.verify_user,
+        password=config.verify_password,
+        database=config.verify_db,
+    )
     
+    admin_conn = None
     try:
+        # One maintenance connection serves both create and drop
+        admin_conn = _connect_admin(verify_config)
+        
         # Create temp database
-        create_temp_db(verify_config)
+        create_temp_db(verify_config, admin_conn)
         
         # Restore backup to temp database
         restore_backup(backup_file, verify_config)
@@ -76,28 +105,51 @@ def verify_backup(backup_file, config):
         raise
     finally:
         # Always drop temp database
-        drop_temp_db(verify_config)
+        drop_temp_db(verify_config, admin_conn)
+        if admin_conn is not None:
+            admin_conn.close()
 
 
-def create_temp_db(config):
-    """Create temporary database for verification."""
-    logger.info(f"Creating temp database: {config['database']}")
-    
+def _connect_admin(config):
+    """Open an autocommit connection to the 'postgres' maintenance database."""
     conn = psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        user=config['user'],
-        password=config['password'],
-        dbname='postgres'  # Connect to default DB to create new one
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        dbname='postgres',  # Connect to default DB to create/drop others
+        connect_timeout=CONNECT_TIMEOUT,
+        # Sits idle during the restore; keepalives stop idle-timeout drops
+        keepalives=1,
+        keepalives_idle=30,
     )
     conn.autocommit = True
+    return conn
+
+
+def create_temp_db(config, conn=None):
+    """Create temporary database for verification.
     
-    cursor = conn.cursor()
-    # Drop if exists (in case of previous failed run)
-    cursor.execute(f"DROP DATABASE IF EXISTS {config['database']}")
-    cursor.execute(f"CREATE DATABASE {config['database']}")
-    cursor.close()
-    conn.close()
+    Uses conn when given (left open), otherwise a short-lived connection.
+    """
+    logger.info(f"Creating temp database: {config.database}")
+    
+    owns_conn = conn is None
+    if owns_conn:
+        conn = _connect_admin(config)
+    
+    try:
+        cursor = conn.cursor()
+        db_name = sql.Identifier(config.database)
+        # Drop if exists (in case of previous failed run)
+        cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(db_name))
+        cursor.execute(sql.SQL("CREATE DATABASE {}").format(db_name))
+        # Throwaway database: don't wait for WAL flushes during the restore
+        cursor.execute(sql.SQL("ALTER DATABASE {} SET synchronous_commit = off").format(db_name))
+        cursor.close()
+    finally:
+        if owns_conn:
+            conn.close()
 
 
 def restore_backup(backup_file, config):
@@ -105,37 +157,98 @@ def restore_backup(backup_file, config):
     logger.info("Restoring backup to temp database...")
     
     env = os.environ.copy()
-    env['PGPASSWORD'] = config['password']
+    env['PGPASSWORD'] = config.password
     
-    # Decompress and restore using gunzip + psql
-    gunzip_cmd = ['gunzip', '-c', backup_file]
+    # Directory-format dumps are tarred and need pg_restore
+    if backup_file.endswith(DIRECTORY_ARCHIVE_EXTENSIONS):
+        restore_directory_archive(backup_file, config, env)
+        return
+    
+    # Custom-format archives are restored directly by pg_restore
+    if backup_file.endswith(CUSTOM_ARCHIVE_EXTENSION):
+        _run_pg_restore(backup_file, config, env)
+        return
+    
+    # Decompress and restore using gunzip/zstd + psql
+    decompress_cmd = _decompress_cmd(backup_file)
     psql_cmd = [
         'psql',
-        '-h', config['host'],
-        '-p', config['port'],
-        '-U', config['user'],
-        '-d', config['database'],
+        '-h', config.host,
+        '-p', config.port,
+        '-U', config.user,
+        '-d', config.database,
         '-q'  # Quiet mode
     ]
     
-    # Pipe gunzip output to psql
-    gunzip_proc = subprocess.Popen(gunzip_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    psql_proc = subprocess.Popen(psql_cmd, stdin=gunzip_proc.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-    gunzip_proc.stdout.close()
+    # Pipe decompressed output to psql
+    decompress_proc = subprocess.Popen(decompress_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    psql_proc = subprocess.Popen(psql_cmd, stdin=decompress_proc.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    decompress_proc.stdout.close()
     
     _, stderr = psql_proc.communicate()
     if psql_proc.returncode != 0:
         raise Exception(f"Restore failed: {stderr.decode()}")
 
 
+def restore_directory_archive(backup_file, config, env):
+    """Extract a tarred directory-format dump and restore it with pg_restore.
+    
+    The dump is extracted inside the backup directory (like the pg_dump
+    staging directory), not the container's small system temp dir.
+    """
+    extract_dir = tempfile.mkdtemp(prefix='.pg_restore_', dir=config.backup_dir)
+    
+    try:
+        decompress_proc = subprocess.Popen(_decompress_cmd(backup_file), stdout=subprocess.PIPE)
+        try:
+            subprocess.run(['tar', '-xf', '-', '-C', extract_dir], stdin=decompress_proc.stdout, check=True, capture_output=True)
+        finally:
+            # Reap the decompressor even if tar failed
+            decompress_proc.stdout.close()
+            returncode = decompress_proc.wait()
+        if returncode != 0:
+            raise Exception("Restore failed: could not decompress archive")
+        
+        entries = os.listdir(extract_dir)
+        if len(entries) != 1:
+            raise Exception(f"Restore failed: expected one dump directory in archive, found {len(entries)} entries")
+        
+        _run_pg_restore(os.path.join(extract_dir, entries[0]), config, env)
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+def _run_pg_restore(archive, config, env):
+    """Restore a directory- or custom-format archive with parallel pg_restore."""
+    pg_restore_cmd = [
+        'pg_restore',
+        '-h', config.host,
+        '-p', config.port,
+        '-U', config.user,
+        '-d', config.database,
+        '-j', str(config.pg_dump_jobs),  # restore tables in parallel too
+        archive
+    ]
+    result = subprocess.run(pg_restore_cmd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Restore failed: {result.stderr}")
+
+
+def _decompress_cmd(backup_file):
+    """Return the command that decompresses backup_file to stdout."""
+    if backup_file.endswith('.zst'):
+        return ['zstd', '-dc', backup_file]
+    return ['gunzip', '-c', backup_file]
+
+
 def verify_data(config):
     """Verify that data exists in temp database."""
     conn = psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        user=config['user'],
-        password=config['password'],
-        dbname=config['database']
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        dbname=config.database
     )
     
     cursor = conn.cursor()
@@ -155,29 +268,40 @@ def verify_data(config):
         raise Exception("No tables found in restored database")
 
 
-def drop_temp_db(config):
-    """Drop temporary database."""
-    logger.info(f"Dropping temp database: {config['database']}")
+def drop_temp_db(config, conn=None):
+    """Drop temporary database.
+    
+    Reuses conn if it is still usable, otherwise (or if it turns out to have
+    been dropped while idle) retries once on a new connection.
+    """
+    logger.info(f"Dropping temp database: {config.database}")
     
     try:
-        conn = psycopg2.connect(
-            host=config['host'],
-            port=config['port'],
-            user=config['user'],
-            password=config['password'],
-            dbname='postgres'
-        )
-        conn.autocommit = True
+        if conn is not None and not conn.closed:
+            try:
+                _drop_database(conn, config)
+                return
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # psycopg2 only notices a dead socket on the next statement
+                logger.warning(f"Admin connection lost, reconnecting: {e}")
         
-        cursor = conn.cursor()
-        # Terminate connections to the database
-        cursor.execute(f"""
-            SELECT pg_terminate_backend(pid) 
-            FROM pg_stat_activity 
-            WHERE datname = '{config['database']}'
-        """)
-        cursor.execute(f"DROP DATABASE IF EXISTS {config['database']}")
-        cursor.close()
-        conn.close()
+        conn = _connect_admin(config)
+        try:
+            _drop_database(conn, config)
+        finally:
+            conn.close()
     except Exception as e:
         logger.warning(f"Failed to drop temp database: {e}")
+
+
+def _drop_database(conn, config):
+    """Terminate sessions on config.database and drop it over conn."""
+    cursor = conn.cursor()
+    # Terminate connections to the database
+    cursor.execute("""
+        SELECT pg_terminate_backend(pid) 
+        FROM pg_stat_activity 
+        WHERE datname = %s
+    """, (config.database,))
+    cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(config.database)))
+    cursor.close()
@@ -9,11 +9,13 @@ import logging
 
 def setup_logger(name=__name__):
     """Setup and return a configured logger."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    # Leave logging alone if the host application already configured it
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s [%(levelname)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
     return logging.getLogger(name)
 
 
@@ -1,13 +1,50 @@
 """Discord notification module for backup alerts."""
 
 import json
-import urllib.request
-import urllib.error
+import hashlib
+import queue
+import atexit
+import threading
 from datetime import datetime, timezone
 from typing import Optional
+
+import urllib3
+
 from logger import logger
 
 
+# Shared keep-alive pool: repeat notifications skip the TCP + TLS handshake.
+# POST is retried on rate limits and server errors, honouring Retry-After.
+_http = urllib3.PoolManager(
+    num_pools=2,
+    maxsize=4,
+    retries=urllib3.Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+)
+_TIMEOUT = urllib3.Timeout(connect=3, read=10)
+_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "PostgreSQL-Backup-Job/1.0",
+}
+
+# Embed scaffolding shared by every notification
+_SUCCESS_COLOR = 5763719  # Green
+_FAILURE_COLOR = 15548997  # Red
+_FOOTER = {"text": "PostgreSQL Backup Job"}
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Notifications are sent by one background worker so a slow webhook never
+# delays the backup; pending ones are flushed at interpreter exit.
+_queue = queue.Queue(maxsize=64)
+_worker = None
+_worker_lock = threading.Lock()
+
+
 def send_discord_notification(
     webhook_url: str,
     success: bool,
@@ -19,7 +56,7 @@ def send_discord_notification(
     error_message: Optional[str] = None,
     error_step: Optional[str] = None,
 ) -> bool:
-    """Send Discord webhook notification.
+    """Queue a Discord webhook notification for background delivery.
     
     Args:
         webhook_url: Discord webhook URL
@@ -33,13 +70,13 @@ def send_discord_notification(
         error_step: Step where error occurred (failure only)
     
     Returns:
-        True if notification sent successfully
+        True if the notification was queued
     """
     if not webhook_url:
         logger.info("Discord webhook URL not configured, skipping notification")
         return False
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = datetime.now(timezone.utc).strftime(_TIMESTAMP_FORMAT)
     
     if success:
         embed = _create_success_embed(
@@ -52,23 +89,66 @@ def send_discord_notification(
 
     payload = {"embeds": [embed]}
     
+    _ensure_worker()
     try:
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
+        _queue.put_nowait((webhook_url, payload, success))
+    except queue.Full:
+        logger.warning("Notification queue full, dropping Discord notification")
+        return False
+    return True
+
+
+def flush_notifications() -> None:
+    """Block until every queued notification has been sent or dropped."""
+    _queue.join()
+
+
+def _ensure_worker() -> None:
+    """Start the background sender thread on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_drain_queue, name="discord-notify", daemon=True)
+            _worker.start()
+            atexit.register(flush_notifications)
+
+
+def _drain_queue() -> None:
+    """Send queued notifications one by one, forever."""
+    while True:
+        webhook_url, payload, success = _queue.get()
+        try:
+            _send_sync(webhook_url, payload, success)
+        except Exception as e:
+            logger.error(f"Failed to send Discord notification: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _send_sync(webhook_url: str, payload: dict, success: bool) -> bool:
+    """POST payload to the webhook; returns True if Discord accepted it."""
+    try:
+        # Compact separators, raw UTF-8: smaller body, no escaping pass
+        data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        # Same embed -> same key, so downstream consumers can drop retried duplicates
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        response = _http.request(
+            "POST",
             webhook_url,
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "PostgreSQL-Backup-Job/1.0",
-            },
-            method="POST",
+            body=data,
+            headers={**_HEADERS, "X-Idempotency-Key": key},
+            timeout=_TIMEOUT,
         )
-        urllib.request.urlopen(req, timeout=10)
-        logger.info(f"Discord notification sent: {'success' if success else 'failure'}")
-        return True
-    except urllib.error.URLError as e:
+    except urllib3.exceptions.HTTPError as e:
         logger.error(f"Failed to send Discord notification: {e}")
         return False
+    
+    if response.status >= 400:
+        logger.error(f"Failed to send Discord notification: HTTP {response.status}")
+        return False
+    
+    logger.info(f"Discord notification sent: {'success' if success else 'failure'}")
+    return True
 
 
 def _create_success_embed(
@@ -89,9 +169,9 @@ def _create_success_embed(
     return {
         "title": "Backup Successful",
         "description": desc,
-        "color": 5763719,  # Green
-        "footer": {"text": "PostgreSQL Backup Job"},
-        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "color": _SUCCESS_COLOR,
+        "footer": _FOOTER,
+        "timestamp": timestamp,
     }
 
 
@@ -109,8 +189,8 @@ def _create_failure_embed(
     return {
         "title": "Backup Failed",
         "description": desc,
-        "color": 15548997,  # Red
-        "footer": {"text": "PostgreSQL Backup Job"},
-        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "color": _FAILURE_COLOR,
+        "footer": _FOOTER,
+        "timestamp": timestamp,
     }
 
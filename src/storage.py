@@ -5,12 +5,63 @@ Handles file storage and S3-compatible remote storage.
 """
 
 import os
-from datetime import datetime, timedelta
-
-import boto3
-from botocore.client import Config
+import time
+import functools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 from logger import logger
+from checksum import CHECKSUM_EXTENSIONS
+
+
+MB = 1024 * 1024
+
+# Multipart part size. Small enough that mid-sized archives still split
+# into parallel parts (s3transfer grows it for files that would exceed
+# 10,000 parts).
+CHUNK_SIZE = 16 * MB
+
+# Parts of a non-seekable stream (stream_to_remote's pipe) are buffered in
+# memory; smaller parts and a cap on buffered parts keep the upload at
+# about 32 MiB, well inside the chart's 256Mi memory limit
+STREAM_CHUNK_SIZE = 8 * MB
+STREAM_BUFFERED_CHUNKS = 4
+
+# Archives above this size are uploaded as concurrent multipart parts
+MULTIPART_THRESHOLD = 8 * MB
+
+# Backup archives subject to retention (plain, directory and custom-format dumps)
+BACKUP_EXTENSIONS = ('.sql.gz', '.tar.gz', '.sql.zst', '.tar.zst', '.dump')
+
+# Checksum sidecars, removed together with (or after) their archive
+SIDECAR_EXTENSIONS = tuple(CHECKSUM_EXTENSIONS.values())
+
+# Parallel unlinks (and, with PARALLEL_CLEANUP, stats) for cleanup; hides
+# per-file latency on NFS/SMB mounts
+CLEANUP_WORKERS = 8
+
+# With ASYNC_CLEANUP, batches at least this large go to a detached 'rm'
+ASYNC_CLEANUP_THRESHOLD = 50
+
+# Paths per 'rm' invocation, well below ARG_MAX
+RM_BATCH_SIZE = 1000
+
+# Key prefix renderer per REMOTE_PATH_FORMAT ('' = flat); plain integer
+# formatting, no strftime/locale machinery
+REMOTE_PATH_FORMATS = {
+    'monthly': lambda now: f"{now.year:04d}-{now.month:02d}",
+    'daily': lambda now: f"{now.year:04d}-{now.month:02d}-{now.day:02d}",
+    'flat': lambda now: '',
+}
+
+# Extra pooled connections beyond S3_CONCURRENCY: the checksum upload runs
+# alongside the archive's multipart transfer and must not wait for a slot
+POOL_HEADROOM = 4
+
+# Serialises first-time client creation when uploads start concurrently
+_s3_client_lock = threading.Lock()
 
 
 def ensure_backup_dir(backup_dir):
@@ -22,70 +73,240 @@ def ensure_backup_dir(backup_dir):
         raise
 
 
-def cleanup_old_backups(backup_dir, retention_days):
-    """Delete backup files older than retention_days."""
+def cleanup_old_backups(backup_dir, retention_days, async_cleanup=False, parallel_cleanup=False):
+    """Delete backup files older than retention_days.
+    
+    With async_cleanup, large batches are unlinked by a detached 'rm' so the
+    job does not wait for the filesystem. With parallel_cleanup, archive
+    mtimes are read by a thread pool (for network-mounted BACKUP_DIRs).
+    """
     if retention_days <= 0:
         logger.info("Retention disabled (RETENTION_DAYS=0)")
         return
     
-    logger.info(f"Cleaning up backups older than {retention_days} days...")
-    cutoff_time = datetime.now() - timedelta(days=retention_days)
-    deleted_count = 0
+    logger.info("Cleaning up backups older than %d days...", retention_days)
+    # Compare raw mtimes against a float cutoff (no datetime per file)
+    cutoff_ts = time.time() - retention_days * 86400
     
     try:
-        for filename in os.listdir(backup_dir):
-            if not filename.endswith('.sql.gz'):
-                continue
-            
-            filepath = os.path.join(backup_dir, filename)
-            file_mtime = datetime.fromtimestamp(os.path.getmtime(filepath))
-            
-            if file_mtime < cutoff_time:
-                os.remove(filepath)
-                logger.info(f"Deleted old backup: {filename}")
-                deleted_count += 1
-        
-        if deleted_count > 0:
-            logger.info(f"Cleanup complete: {deleted_count} file(s) removed")
-        else:
+        expired = list(_collect_expired(backup_dir, cutoff_ts, parallel_cleanup))
+        if not expired:
             logger.info("No old backups to clean up")
-            
+            return
+        
+        if async_cleanup and len(expired) >= ASYNC_CLEANUP_THRESHOLD:
+            _remove_in_background(expired)
+            logger.info("Cleanup started in background: %d file(s)", len(expired))
+            return
+        
+        # unlink releases the GIL, so deletions overlap in the pool
+        with ThreadPoolExecutor(max_workers=CLEANUP_WORKERS) as executor:
+            deleted_count = len(list(executor.map(_remove_backup, expired)))
+        
+        logger.info("Cleanup complete: %d file(s) removed", deleted_count)
+        
     except OSError as e:
-        logger.error(f"Cleanup failed: {e}")
+        logger.error("Cleanup failed: %s", e)
         # Don't raise - cleanup failure shouldn't fail the backup
 
 
-def upload_to_remote(backup_file, config):
-    """Upload backup file to S3-compatible storage."""
-    logger.info(f"Uploading to remote storage: {config['remote_bucket']}")
+def _collect_expired(backup_dir, cutoff_ts, parallel=False):
+    """Yield paths of expired archives, then of their orphaned sidecars.
     
-    try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=config['remote_endpoint'],
-            aws_access_key_id=config['remote_access_key'],
-            aws_secret_access_key=config['remote_secret_key'],
-            region_name=config['remote_region'],
-            config=Config(signature_version='s3v4')
+    scandir entries carry their own path and cached stat(); with parallel,
+    the per-archive stats run in a thread pool so their latency overlaps.
+    """
+    archives = []
+    sidecars = []
+    with os.scandir(backup_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.endswith(SIDECAR_EXTENSIONS):
+                if os.path.splitext(name)[0].endswith(BACKUP_EXTENSIONS):
+                    sidecars.append(entry)
+            elif name.endswith(BACKUP_EXTENSIONS):
+                archives.append(entry)
+    
+    if parallel and len(archives) > 1:
+        # stat releases the GIL, so many round trips are in flight at once
+        with ThreadPoolExecutor(max_workers=CLEANUP_WORKERS) as executor:
+            mtimes = list(executor.map(_entry_mtime, archives))
+    else:
+        mtimes = map(_entry_mtime, archives)
+    
+    kept = set()
+    for entry, mtime in zip(archives, mtimes):
+        if mtime < cutoff_ts:
+            yield entry.path
+        else:
+            kept.add(entry.name)
+    
+    # Sidecars whose archive expired now or was removed earlier
+    for entry in sidecars:
+        if os.path.splitext(entry.name)[0] not in kept:
+            yield entry.path
+
+
+def _entry_mtime(entry):
+    """Return an entry's mtime.
+    
+    lstat: on Linux scandir already has the dirent, and a symlink is judged
+    by its own age, not its target's.
+    """
+    return entry.stat(follow_symlinks=False).st_mtime
+
+
+def _remove_backup(path):
+    """Delete one expired backup file."""
+    os.remove(path)
+    # Per-file detail only at DEBUG; the caller logs one summary line
+    logger.debug("Deleted old backup: %s", path)
+    return path
+
+
+def _remove_in_background(paths):
+    """Hand paths to detached 'rm -f' processes and return immediately."""
+    for i in range(0, len(paths), RM_BATCH_SIZE):
+        subprocess.Popen(
+            ['rm', '-f', '--'] + paths[i:i + RM_BATCH_SIZE],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
         )
+
+
+def _get_s3_client(config):
+    """Return the shared S3 client for config's endpoint and credentials.
+    
+    boto3 clients are thread-safe, so reusing one client across uploads
+    avoids repeated model loading, TLS handshakes and signer setup.
+    """
+    with _s3_client_lock:
+        return _create_s3_client(
+            config.remote_endpoint,
+            config.remote_access_key,
+            config.remote_secret_key,
+            config.remote_region,
+            config.s3_concurrency + POOL_HEADROOM,
+        )
+
+
+@functools.lru_cache(maxsize=4)
+def _create_s3_client(endpoint, access_key, secret_key, region, pool_size):
+    """Create (once per endpoint/credentials) an S3 client."""
+    # Imported on first use: loading boto3 takes a few hundred ms and local-only
+    # backups never need it
+    import boto3
+    from botocore.client import Config
+    
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        config=Config(
+            signature_version='s3v4',
+            # At least one pooled connection per multipart transfer thread
+            max_pool_connections=pool_size,
+            # Keep idle pooled sockets alive between multipart parts and uploads
+            tcp_keepalive=True,
+            # Client-side rate limiting backs off when S3 throttles
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+        )
+    )
+
+
+def create_transfer_config(config, chunk_size=CHUNK_SIZE):
+    """Create multipart transfer settings for large backup uploads."""
+    from boto3.s3.transfer import TransferConfig
+    
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=chunk_size,
+        max_concurrency=config.s3_concurrency,
+        use_threads=True,
+    )
+
+
+def create_stream_transfer_config(config):
+    """Create multipart settings with bounded memory for non-seekable streams."""
+    from boto3.s3.transfer import TransferConfig
+    
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=STREAM_CHUNK_SIZE,
+        max_concurrency=min(config.s3_concurrency, STREAM_BUFFERED_CHUNKS),
+        use_threads=True,
+    )
+    # Not a boto3 TransferConfig argument, but honoured by s3transfer
+    transfer_config.max_in_memory_upload_chunks = STREAM_BUFFERED_CHUNKS
+    return transfer_config
+
+
+def upload_to_remote(backup_file, config, prefix=None):
+    """Upload backup file to S3-compatible storage.
+    
+    prefix comes from remote_prefix(); it is computed from the current
+    time when omitted. Thin wrapper over upload_stream_to_remote.
+    """
+    try:
+        f = open(backup_file, 'rb')
+    except OSError as e:
+        logger.error(f"Remote upload failed: {e}")
+        raise
+    
+    with f:
+        upload_stream_to_remote(f, os.path.basename(backup_file), config, prefix)
+
+
+def upload_stream_to_remote(fileobj, filename, config, prefix=None):
+    """Upload a readable byte stream to S3-compatible storage as filename."""
+    logger.info(f"Uploading to remote storage: {config.remote_bucket}")
+    
+    try:
+        s3_client = _get_s3_client(config)
+        remote_path = _remote_path(filename, config, prefix)
         
-        filename = os.path.basename(backup_file)
-        
-        # Generate path based on format
-        path_format = config['remote_path_format']
-        now = datetime.now()
-        
-        if path_format == 'monthly':
-            remote_path = f"{now.strftime('%Y-%m')}/{filename}"
-        elif path_format == 'daily':
-            remote_path = f"{now.strftime('%Y-%m-%d')}/{filename}"
-        else:  # flat
-            remote_path = filename
+        if fileobj.seekable():
+            transfer_config = create_transfer_config(config)
+        else:
+            transfer_config = create_stream_transfer_config(config)
         
-        s3_client.upload_file(backup_file, config['remote_bucket'], remote_path)
+        s3_client.upload_fileobj(
+            fileobj, config.remote_bucket, remote_path,
+            Config=transfer_config
+        )
         
         logger.info(f"Uploaded to remote: {remote_path}")
         
     except Exception as e:
         logger.error(f"Remote upload failed: {e}")
         raise
+
+
+def delete_from_remote(filename, config, prefix=None):
+    """Delete an uploaded object, e.g. a truncated streamed archive."""
+    try:
+        s3_client = _get_s3_client(config)
+        remote_path = _remote_path(filename, config, prefix)
+        s3_client.delete_object(Bucket=config.remote_bucket, Key=remote_path)
+        logger.info(f"Deleted remote object: {remote_path}")
+    except Exception as e:
+        logger.warning(f"Failed to delete remote object: {e}")
+
+
+def remote_prefix(config, now=None):
+    """Return the dated key prefix for REMOTE_PATH_FORMAT ('' for flat).
+    
+    Computed once per backup so the archive and its checksum share it.
+    """
+    render = REMOTE_PATH_FORMATS.get(config.remote_path_format, REMOTE_PATH_FORMATS['flat'])
+    return render(now or datetime.now())
+
+
+def _remote_path(filename, config, prefix=None):
+    """Generate the object key for filename under prefix."""
+    if prefix is None:
+        prefix = remote_prefix(config)
+    return f"{prefix}/{filename}" if prefix else filename
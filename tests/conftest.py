@@ -10,34 +10,59 @@ from unittest.mock import MagicMock
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+from config import BackupConfig, get_config
+
+
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    """Re-read the environment for every test."""
+    get_config.cache_clear()
+    yield
+    get_config.cache_clear()
+
 
 @pytest.fixture
 def mock_config():
-    """Return a mock configuration dictionary."""
-    return {
-        'host': 'localhost',
-        'port': '5432',
-        'user': 'testuser',
-        'password': 'testpass',
-        'database': 'testdb',
-        'backup_dir': './backups',
-        'retry_count': 3,
-        'retry_delay': 1,
-        'retention_days': 7,
-        'verify_enabled': False,
-        'verify_host': 'localhost',
-        'verify_port': '5432',
-        'verify_user': 'testuser',
-        'verify_password': 'testpass',
-        'verify_db': 'testdb_verify',
-        'backup_target': 'local',
-        'remote_endpoint': 'http://localhost:9000',
-        'remote_bucket': 'test-bucket',
-        'remote_access_key': 'minioadmin',
-        'remote_secret_key': 'minioadmin',
-        'remote_region': 'us-east-1',
-        'remote_path_format': 'monthly',
-    }
+    """Return a test BackupConfig."""
+    return BackupConfig(
+        host='localhost',
+        port='5432',
+        user='testuser',
+        password='testpass',
+        database='testdb',
+        backup_dir='./backups',
+        preflight_check=True,
+        retry_count=3,
+        retry_delay=1,
+        retry_max_delay=60,
+        retention_days=7,
+        async_cleanup=False,
+        parallel_cleanup=False,
+        pg_dump_format='plain',
+        pg_dump_jobs=4,
+        compression='gzip',
+        gzip_level=1,
+        zstd_level=3,
+        pigz_threads=0,
+        checksum_algo='sha256',
+        verify_enabled=False,
+        verify_host='localhost',
+        verify_port='5432',
+        verify_user='testuser',
+        verify_password='testpass',
+        verify_db='testdb_verify',
+        backup_target='local',
+        remote_endpoint='http://localhost:9000',
+        remote_bucket='test-bucket',
+        remote_access_key='minioadmin',
+        remote_secret_key='minioadmin',
+        remote_region='us-east-1',
+        remote_path_format='monthly',
+        s3_concurrency=16,
+        discord_webhook_url='',
+        discord_notify_success=True,
+        discord_notify_failure=True,
+    )
 
 
 @pytest.fixture
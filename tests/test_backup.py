@@ -0,0 +1,125 @@
+"""
+Tests for backup module.
+"""
+
+import io
+import logging
+import subprocess
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+
+from backup import (
+    STDERR_TAIL_LINES, _log_stderr, _pipe_through_compression, stream_to_remote,
+)
+from checksum import HashingWriter
+
+
+DUMP_BYTES = b"\x1f\x8b compressed dump " * 4096
+
+
+def _fake_dump(data, error=None):
+    """Return a dump_to_stream stand-in that writes data, then optionally fails."""
+    def dump_to_stream(config, dest, archive_name):
+        sink = HashingWriter(dest, config.checksum_algo)
+        sink.write(data)
+        if error:
+            raise error
+        return sink
+    return dump_to_stream
+
+
+def _reading_upload(uploads):
+    """Return an upload_stream_to_remote stand-in that drains the stream."""
+    def upload_stream_to_remote(fileobj, filename, config, prefix=None):
+        uploads[filename] = fileobj.read()
+    return upload_stream_to_remote
+
+
+class TestStreamToRemote:
+    """Tests for stream_to_remote function."""
+
+    @patch('backup.delete_from_remote')
+    def test_stream_uploads_archive_and_checksum(self, mock_delete, mock_config):
+        """Test that the dump is streamed to remote followed by its checksum."""
+        uploads = {}
+        config = replace(mock_config, backup_target='remote')
+        
+        with patch('backup.dump_to_stream', _fake_dump(DUMP_BYTES)), \
+                patch('backup.upload_stream_to_remote', _reading_upload(uploads)):
+            size = stream_to_remote(config, "/backups/backup_2026.sql.gz", "2026-01")
+        
+        assert size == len(DUMP_BYTES)
+        assert uploads["backup_2026.sql.gz"] == DUMP_BYTES
+        assert uploads["backup_2026.sql.gz.sha256"].endswith(b"  backup_2026.sql.gz\n")
+        mock_delete.assert_not_called()
+
+    @patch('backup.delete_from_remote')
+    def test_dump_failure_deletes_truncated_object(self, mock_delete, mock_config):
+        """Test that a failed pg_dump removes the partial upload and fails the run."""
+        uploads = {}
+        error = subprocess.CalledProcessError(1, ['pg_dump'])
+        
+        with patch('backup.dump_to_stream', _fake_dump(DUMP_BYTES[:1000], error)), \
+                patch('backup.upload_stream_to_remote', _reading_upload(uploads)):
+            with pytest.raises(subprocess.CalledProcessError):
+                stream_to_remote(mock_config, "/backups/backup_2026.sql.gz", "2026-01")
+        
+        mock_delete.assert_called_once_with("backup_2026.sql.gz", mock_config, "2026-01")
+        assert "backup_2026.sql.gz.sha256" not in uploads
+
+    @patch('backup.delete_from_remote')
+    def test_upload_failure_stops_dump(self, mock_delete, mock_config):
+        """Test that an upload error fails the run without hanging the dump thread."""
+        def failing_upload(fileobj, filename, config, prefix=None):
+            raise RuntimeError("network down")
+        
+        # More than a pipe buffer, so the dump blocks until the reader closes
+        with patch('backup.dump_to_stream', _fake_dump(DUMP_BYTES * 64)), \
+                patch('backup.upload_stream_to_remote', failing_upload):
+            with pytest.raises(RuntimeError, match="network down"):
+                stream_to_remote(mock_config, "/backups/backup_2026.sql.gz", "2026-01")
+        
+        # s3transfer aborts the failed multipart upload itself
+        mock_delete.assert_not_called()
+
+
+class TestStderrTail:
+    """Tests for _log_stderr and the error reporting built on it."""
+
+    def test_tail_keeps_last_lines_only(self):
+        """Test that only the last STDERR_TAIL_LINES lines are kept."""
+        proc = subprocess.Popen(
+            ['sh', '-c', 'for i in $(seq 1 30); do echo "pg_dump: line $i" >&2; done'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        reader, tail = _log_stderr(proc)
+        proc.wait()
+        reader.join()
+        
+        assert len(tail) == STDERR_TAIL_LINES
+        assert tail[0] == "pg_dump: line 11"
+        assert tail[-1] == "pg_dump: line 30"
+
+    def test_lines_are_logged_verbatim(self, caplog):
+        """Test that stderr lines are logged without an extra name prefix."""
+        proc = subprocess.Popen(
+            ['sh', '-c', 'echo "pg_dump: dumping contents of table users" >&2'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        with caplog.at_level(logging.INFO, logger='backup'):
+            reader, _ = _log_stderr(proc)
+            proc.wait()
+            reader.join()
+        
+        assert caplog.messages == ["pg_dump: dumping contents of table users"]
+
+    def test_failure_error_includes_stderr_tail(self, mock_config):
+        """Test that a failing dump command raises with its stderr tail."""
+        cmd = ['sh', '-c', 'echo "pg_dump: error: connection refused" >&2; exit 1']
+        
+        with pytest.raises(subprocess.CalledProcessError) as excinfo:
+            _pipe_through_compression(cmd, {}, io.BytesIO(), mock_config, compress=False)
+        
+        assert "pg_dump: error: connection refused" in excinfo.value.stderr
@@ -2,23 +2,23 @@
 Tests for checksum module.
 """
 
+import io
 import os
+import hashlib
 import pytest
 
-from checksum import generate_checksum
+from checksum import HashingWriter, write_checksum
 
 
-class TestGenerateChecksum:
-    """Tests for generate_checksum function."""
+class TestWriteChecksum:
+    """Tests for write_checksum function."""
 
-    def test_generate_checksum_creates_file(self, tmp_path):
+    def test_write_checksum_creates_file(self, tmp_path):
         """Test that checksum file is created."""
-        # Create a test file
         test_file = tmp_path / "backup.sql.gz"
         test_file.write_bytes(b"test backup content")
         
-        # Generate checksum
-        result = generate_checksum(str(test_file))
+        result = write_checksum(str(test_file), hashlib.sha256(b"test backup content").hexdigest())
         
         # Check .sha256 file was created
         assert result == str(test_file) + ".sha256"
@@ -26,12 +26,11 @@ class TestGenerateChecksum:
 
     def test_checksum_format(self, tmp_path):
         """Test that checksum file has correct format: 'hash  filename'."""
-        # Create a test file
         test_file = tmp_path / "backup.sql.gz"
-        test_file.write_bytes(b"test backup content")
+        writer = HashingWriter(io.BytesIO())
+        writer.write(b"test backup content")
         
-        # Generate checksum
-        checksum_file = generate_checksum(str(test_file))
+        checksum_file = write_checksum(str(test_file), writer.hexdigest())
         
         # Read and verify format
         with open(checksum_file, 'r') as f:
@@ -43,26 +42,49 @@ class TestGenerateChecksum:
         assert len(parts[0]) == 64  # SHA256 = 64 hex chars
         assert parts[1] == "backup.sql.gz"
 
-    def test_checksum_reproducible(self, tmp_path):
-        """Test that same file produces same checksum."""
-        # Create a test file
+    def test_write_checksum_xxh64_sidecar(self, tmp_path):
+        """Test that xxh64 checksums are written to a .xxh64 file."""
         test_file = tmp_path / "backup.sql.gz"
-        test_file.write_bytes(b"identical content")
+        test_file.write_bytes(b"test backup content")
         
-        # Generate checksum twice
-        generate_checksum(str(test_file))
+        checksum_file = write_checksum(str(test_file), "0123456789abcdef", 'xxh64')
         
-        with open(str(test_file) + ".sha256", 'r') as f:
-            first_checksum = f.read().split()[0]
+        assert checksum_file == str(test_file) + ".xxh64"
+        with open(checksum_file, 'r') as f:
+            assert f.read() == "0123456789abcdef  backup.sql.gz\n"
+
+    def test_write_checksum_missing_dir(self, tmp_path):
+        """Test that OSError is raised when the sidecar cannot be written."""
+        with pytest.raises(OSError):
+            write_checksum(str(tmp_path / "missing" / "backup.sql.gz"), "0123456789abcdef")
+
+
+class TestHashingWriter:
+    """Tests for HashingWriter class."""
+
+    def test_hashing_writer_passes_through_and_hashes(self):
+        """Test that written bytes reach the file and match a direct SHA256."""
+        buffer = io.BytesIO()
+        writer = HashingWriter(buffer)
         
-        generate_checksum(str(test_file))
+        writer.write(b"first chunk ")
+        writer.write(b"second chunk")
         
-        with open(str(test_file) + ".sha256", 'r') as f:
-            second_checksum = f.read().split()[0]
+        assert buffer.getvalue() == b"first chunk second chunk"
+        assert writer.hexdigest() == hashlib.sha256(b"first chunk second chunk").hexdigest()
+
+    def test_hashing_writer_none_only_counts(self):
+        """Test that algo='none' passes bytes through without a digest."""
+        buffer = io.BytesIO()
+        writer = HashingWriter(buffer, 'none')
         
-        assert first_checksum == second_checksum
+        writer.write(b"backup data")
+        
+        assert buffer.getvalue() == b"backup data"
+        assert writer.size == len(b"backup data")
+        assert writer.hexdigest() is None
 
-    def test_generate_checksum_file_not_found(self, tmp_path):
-        """Test that OSError is raised for non-existent file."""
-        with pytest.raises(OSError):
-            generate_checksum(str(tmp_path / "nonexistent.sql.gz"))
+    def test_hashing_writer_rejects_unknown_algo(self):
+        """Test that an unknown algorithm fails up front instead of hashing sha256."""
+        with pytest.raises(ValueError, match="CHECKSUM_ALGO"):
+            HashingWriter(io.BytesIO(), 'md5')
@@ -0,0 +1,104 @@
+"""
+Tests for compression module.
+"""
+
+import gzip
+import shutil
+import subprocess
+from dataclasses import replace
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from compression import check_archive, compress_stream
+
+
+class TestCompressStream:
+    """Tests for compress_stream function."""
+
+    @patch('compression.shutil.which', return_value=None)
+    def test_gzip_fallback_roundtrip(self, mock_which, tmp_path, mock_config):
+        """Test that gzip fallback produces a valid gzip stream."""
+        source = tmp_path / "dump.sql"
+        source.write_bytes(b"CREATE TABLE users (id int);\n" * 100)
+        dest = tmp_path / "dump.sql.gz"
+
+        with open(source, 'rb') as f_in, open(dest, 'wb') as f_out:
+            compress_stream(f_in, f_out, mock_config)
+
+        assert gzip.decompress(dest.read_bytes()) == source.read_bytes()
+
+    @patch('compression.shutil.which', return_value=None)
+    def test_gzip_fallback_uses_configured_level(self, mock_which, tmp_path, mock_config):
+        """Test that GZIP_LEVEL reaches the gzip module."""
+        source = tmp_path / "dump.sql"
+        source.write_bytes(b"CREATE TABLE users (id int);\n" * 100)
+        dest = tmp_path / "dump.sql.gz"
+
+        with open(source, 'rb') as f_in, open(dest, 'wb') as f_out:
+            compress_stream(f_in, f_out, replace(mock_config, gzip_level=9))
+
+        # XFL header byte: 2 = maximum compression, 4 = fastest
+        assert dest.read_bytes()[8] == 2
+
+    @pytest.mark.skipif(shutil.which('pigz') is None, reason="pigz not installed")
+    def test_pigz_roundtrip(self, tmp_path, mock_config):
+        """Test that pigz produces a valid gzip stream."""
+        source = tmp_path / "dump.sql"
+        source.write_bytes(b"INSERT INTO users VALUES (1);\n" * 100)
+        dest = tmp_path / "dump.sql.gz"
+
+        with open(source, 'rb') as f_in, open(dest, 'wb') as f_out:
+            compress_stream(f_in, f_out, mock_config)
+
+        assert gzip.decompress(dest.read_bytes()) == source.read_bytes()
+
+    @patch('compression.subprocess.Popen')
+    @patch('compression.shutil.which', return_value='/usr/bin/pigz')
+    def test_pigz_failure_raises(self, mock_which, mock_popen, mock_config):
+        """Test that a failing pigz process raises CalledProcessError."""
+        mock_proc = MagicMock()
+        mock_proc.stdout.read.return_value = b""
+        mock_proc.stderr.read.return_value = b"pigz: write error"
+        mock_proc.returncode = 1
+        mock_popen.return_value = mock_proc
+
+        with pytest.raises(subprocess.CalledProcessError):
+            compress_stream(MagicMock(), MagicMock(), mock_config)
+
+    def test_zstd_roundtrip(self, tmp_path, mock_config):
+        """Test that zstd compression produces a valid zstd stream."""
+        zstandard = pytest.importorskip('zstandard')
+        source = tmp_path / "dump.sql"
+        source.write_bytes(b"INSERT INTO users VALUES (1);\n" * 100)
+        dest = tmp_path / "dump.sql.zst"
+        config = replace(mock_config, compression='zstd')
+
+        with open(source, 'rb') as f_in, open(dest, 'wb') as f_out:
+            compress_stream(f_in, f_out, config)
+
+        with open(dest, 'rb') as f:
+            assert zstandard.ZstdDecompressor().stream_reader(f).read() == source.read_bytes()
+
+
+class TestCheckArchive:
+    """Tests for check_archive function."""
+
+    @pytest.mark.parametrize('tool', [None, shutil.which('gzip')])
+    def test_valid_archive_passes(self, tool, tmp_path, mock_config):
+        """Test that an intact gzip archive passes, with and without a CLI tool."""
+        archive = tmp_path / "backup.sql.gz"
+        archive.write_bytes(gzip.compress(b"INSERT INTO users VALUES (1);\n" * 100))
+
+        with patch('compression.shutil.which', return_value=tool):
+            check_archive(str(archive), mock_config)
+
+    @pytest.mark.parametrize('tool', [None, shutil.which('gzip')])
+    def test_truncated_archive_fails(self, tool, tmp_path, mock_config):
+        """Test that a truncated gzip archive is rejected."""
+        archive = tmp_path / "backup.sql.gz"
+        archive.write_bytes(gzip.compress(b"INSERT INTO users VALUES (1);\n" * 100)[:-8])
+
+        with patch('compression.shutil.which', return_value=tool):
+            with pytest.raises(Exception):
+                check_archive(str(archive), mock_config)
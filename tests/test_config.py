@@ -3,6 +3,7 @@ Tests for config module.
 """
 
 import os
+import dataclasses
 from unittest.mock import patch
 
 import pytest
@@ -18,10 +19,10 @@ class TestGetConfig:
         with patch.dict(os.environ, {}, clear=True):
             config = get_config()
             
-            assert config['host'] == 'localhost'
-            assert config['port'] == '5432'
-            assert config['backup_target'] == 'local'
-            assert config['retention_days'] == 7
+            assert config.host == 'localhost'
+            assert config.port == '5432'
+            assert config.backup_target == 'local'
+            assert config.retention_days == 7
 
     def test_get_config_from_env(self):
         """Test that values are read from environment variables."""
@@ -38,13 +39,13 @@ class TestGetConfig:
         with patch.dict(os.environ, env_vars, clear=True):
             config = get_config()
             
-            assert config['host'] == 'db.example.com'
-            assert config['port'] == '5433'
-            assert config['user'] == 'admin'
-            assert config['password'] == 'secret'
-            assert config['database'] == 'production'
-            assert config['backup_target'] == 'remote'
-            assert config['retention_days'] == 30
+            assert config.host == 'db.example.com'
+            assert config.port == '5433'
+            assert config.user == 'admin'
+            assert config.password == 'secret'
+            assert config.database == 'production'
+            assert config.backup_target == 'remote'
+            assert config.retention_days == 30
 
     def test_verify_config_inherits_db_settings(self):
         """Test that verify settings fallback to DB settings."""
@@ -59,7 +60,35 @@ class TestGetConfig:
             config = get_config()
             
             # Verify settings should inherit from DB settings
-            assert config['verify_host'] == 'db.example.com'
-            assert config['verify_port'] == '5433'
-            assert config['verify_user'] == 'admin'
-            assert config['verify_password'] == 'secret'
+            assert config.verify_host == 'db.example.com'
+            assert config.verify_port == '5433'
+            assert config.verify_user == 'admin'
+            assert config.verify_password == 'secret'
+
+    def test_config_is_frozen(self):
+        """Test that the parsed config cannot be modified at runtime."""
+        with patch.dict(os.environ, {}, clear=True):
+            config = get_config()
+        
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            config.host = 'other'
+
+    def test_config_is_parsed_once(self):
+        """Test that repeated calls reuse the parsed config."""
+        with patch.dict(os.environ, {'POSTGRES_HOST': 'db.example.com'}, clear=True):
+            first = get_config()
+            os.environ['POSTGRES_HOST'] = 'other.example.com'
+            
+            assert get_config() is first
+            
+            get_config.cache_clear()
+            assert get_config().host == 'other.example.com'
+
+    @pytest.mark.parametrize('name', [
+        'COMPRESSION', 'PG_DUMP_FORMAT', 'CHECKSUM_ALGO', 'BACKUP_TARGET', 'REMOTE_PATH_FORMAT',
+    ])
+    def test_invalid_choice_raises(self, name):
+        """Test that a typo in an enumerated setting fails instead of falling back."""
+        with patch.dict(os.environ, {name: 'bogus'}, clear=True):
+            with pytest.raises(ValueError, match=name):
+                get_config()
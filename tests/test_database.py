@@ -2,12 +2,18 @@
 Tests for database module.
 """
 
+import subprocess
 import pytest
+from dataclasses import replace
 from unittest.mock import patch, MagicMock
 
 import psycopg2
+from psycopg2 import sql
 
-from database import check_connection, connect_with_retry
+from database import (
+    check_connection, connect_with_retry, drop_temp_db, restore_backup,
+    restore_directory_archive, verify_backup,
+)
 
 
 class TestTestConnection:
@@ -24,6 +30,7 @@ class TestTestConnection:
         
         assert result is True
         mock_conn.close.assert_called_once()
+        assert mock_connect.call_args.kwargs['connect_timeout'] == 5
 
     @patch('database.psycopg2.connect')
     def test_connection_failure(self, mock_connect, mock_config):
@@ -71,4 +78,113 @@ class TestConnectWithRetry:
         
         assert result is False
         # Should try retry_count times (default 3)
-        assert mock_test_conn.call_count == mock_config['retry_count']
+        assert mock_test_conn.call_count == mock_config.retry_count
+
+    @patch('database.random.uniform', return_value=1.0)
+    @patch('database.time.sleep')
+    @patch('database.check_connection')
+    def test_connect_with_retry_backs_off_exponentially(self, mock_test_conn, mock_sleep, mock_uniform, mock_config):
+        """Test that retry delays double each attempt up to RETRY_MAX_DELAY."""
+        mock_test_conn.return_value = False
+        config = replace(mock_config, retry_count=5, retry_delay=2, retry_max_delay=10)
+        
+        connect_with_retry(config)
+        
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        assert delays == [2, 4, 8, 10]
+
+
+class TestRestoreDirectoryArchive:
+    """Tests for restore_directory_archive function."""
+
+    @patch('database.subprocess')
+    @patch('database.tempfile.mkdtemp')
+    def test_pg_restore_runs_parallel_jobs(self, mock_mkdtemp, mock_subprocess, tmp_path, mock_config):
+        """Test that pg_restore uses PG_DUMP_JOBS workers."""
+        (tmp_path / "backup_2026").mkdir()
+        mock_mkdtemp.return_value = str(tmp_path)
+        mock_subprocess.Popen.return_value.wait.return_value = 0
+        mock_subprocess.run.return_value.returncode = 0
+        
+        restore_directory_archive("backup_2026.tar.gz", mock_config, {})
+        
+        pg_restore_cmd = mock_subprocess.run.call_args.args[0]
+        assert pg_restore_cmd[0] == 'pg_restore'
+        assert pg_restore_cmd[pg_restore_cmd.index('-j') + 1] == str(mock_config.pg_dump_jobs)
+        assert mock_mkdtemp.call_args.kwargs['dir'] == mock_config.backup_dir
+
+    @patch('database.subprocess.run')
+    @patch('database.subprocess.Popen')
+    @patch('database.tempfile.mkdtemp')
+    def test_tar_failure_reaps_decompressor(self, mock_mkdtemp, mock_popen, mock_run, tmp_path, mock_config):
+        """Test that the decompress process is closed and waited when tar fails."""
+        mock_mkdtemp.return_value = str(tmp_path)
+        mock_run.side_effect = subprocess.CalledProcessError(2, ['tar'])
+        
+        with pytest.raises(subprocess.CalledProcessError):
+            restore_directory_archive("backup_2026.tar.gz", mock_config, {})
+        
+        mock_popen.return_value.stdout.close.assert_called_once()
+        mock_popen.return_value.wait.assert_called_once()
+
+    @patch('database.subprocess')
+    @patch('database.tempfile.mkdtemp')
+    def test_empty_archive_raises(self, mock_mkdtemp, mock_subprocess, tmp_path, mock_config):
+        """Test that an archive without a dump directory fails with a clear error."""
+        mock_mkdtemp.return_value = str(tmp_path)
+        mock_subprocess.Popen.return_value.wait.return_value = 0
+        
+        with pytest.raises(Exception, match="expected one dump directory"):
+            restore_directory_archive("backup_2026.tar.gz", mock_config, {})
+
+
+class TestRestoreBackup:
+    """Tests for restore_backup function."""
+
+    @patch('database.subprocess.run')
+    def test_custom_archive_uses_pg_restore(self, mock_run, mock_config):
+        """Test that .dump archives go straight to parallel pg_restore."""
+        mock_run.return_value.returncode = 0
+        
+        restore_backup("backup_2026.dump", mock_config)
+        
+        cmd = mock_run.call_args.args[0]
+        assert cmd[0] == 'pg_restore'
+        assert '-j' in cmd
+        assert cmd[-1] == "backup_2026.dump"
+
+
+class TestVerifyBackup:
+    """Tests for verify_backup function."""
+
+    @patch('database.verify_data')
+    @patch('database.restore_backup')
+    @patch('database.psycopg2.connect')
+    def test_create_and_drop_share_connection(self, mock_connect, mock_restore, mock_verify_data, mock_config):
+        """Test that the temp DB is created and dropped over one connection."""
+        mock_conn = MagicMock(closed=0)
+        mock_connect.return_value = mock_conn
+        
+        verify_backup("backup.sql.gz", mock_config)
+        
+        mock_connect.assert_called_once()
+        statements = [c.args[0] for c in mock_conn.cursor.return_value.execute.call_args_list]
+        assert statements[1] == sql.SQL("CREATE DATABASE {}").format(sql.Identifier("testdb_verify"))
+        assert statements[2] == sql.SQL("ALTER DATABASE {} SET synchronous_commit = off").format(sql.Identifier("testdb_verify"))
+        assert statements[-1] == sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier("testdb_verify"))
+        mock_conn.close.assert_called_once()
+        assert mock_connect.call_args.kwargs['keepalives'] == 1
+
+    @patch('database.psycopg2.connect')
+    def test_drop_reconnects_when_shared_connection_died(self, mock_connect, mock_config):
+        """Test that the temp DB is still dropped if the idle admin connection was lost."""
+        stale_conn = MagicMock(closed=0)
+        stale_conn.cursor.return_value.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+        fresh_conn = MagicMock(closed=0)
+        mock_connect.return_value = fresh_conn
+        
+        drop_temp_db(mock_config, stale_conn)
+        
+        statements = [c.args[0] for c in fresh_conn.cursor.return_value.execute.call_args_list]
+        assert statements[-1] == sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(mock_config.database))
+        fresh_conn.close.assert_called_once()
@@ -1,14 +1,18 @@
 """Tests for notification module."""
 
+import queue
 import pytest
 from unittest.mock import patch, MagicMock
-import urllib.error
+import urllib3
 
 import sys
 sys.path.insert(0, 'src')
 
+import notification
 from notification import (
     send_discord_notification,
+    flush_notifications,
+    _send_sync,
     _create_success_embed,
     _create_failure_embed,
 )
@@ -72,10 +76,10 @@ class TestSendNotification:
         )
         assert result is False
     
-    @patch('notification.urllib.request.urlopen')
-    def test_send_notification_success(self, mock_urlopen):
-        """Should send notification successfully."""
-        mock_urlopen.return_value = MagicMock()
+    @patch('notification._http')
+    def test_send_notification_success(self, mock_http):
+        """Should queue the notification and send it in the background."""
+        mock_http.request.return_value = MagicMock(status=204)
         
         result = send_discord_notification(
             webhook_url="https://discord.com/api/webhooks/test",
@@ -86,21 +90,55 @@ class TestSendNotification:
             storage="Local",
             duration=3.0,
         )
+        flush_notifications()
         
         assert result is True
-        mock_urlopen.assert_called_once()
+        mock_http.request.assert_called_once()
+        assert mock_http.request.call_args.args[0] == "POST"
     
-    @patch('notification.urllib.request.urlopen')
-    def test_http_error_handling(self, mock_urlopen):
+    @patch('notification._http')
+    def test_idempotency_key_is_stable(self, mock_http):
+        """Same payload should carry the same X-Idempotency-Key on every send."""
+        mock_http.request.return_value = MagicMock(status=204)
+        payload = {"embeds": [{"title": "Backup Successful"}]}
+        
+        _send_sync("https://discord.com/api/webhooks/test", payload, True)
+        _send_sync("https://discord.com/api/webhooks/test", payload, True)
+        _send_sync("https://discord.com/api/webhooks/test", {"embeds": []}, True)
+        
+        keys = [c.kwargs['headers']['X-Idempotency-Key'] for c in mock_http.request.call_args_list]
+        assert len(keys[0]) == 32
+        assert keys[0] == keys[1]
+        assert keys[0] != keys[2]
+    
+    @patch('notification._http')
+    def test_http_error_handling(self, mock_http):
         """Should handle HTTP errors gracefully."""
-        mock_urlopen.side_effect = urllib.error.URLError("Network error")
+        mock_http.request.side_effect = urllib3.exceptions.HTTPError("Network error")
+        
+        result = _send_sync("https://discord.com/api/webhooks/test", {"embeds": []}, False)
+        
+        assert result is False
+    
+    @patch('notification._http')
+    def test_error_status_handling(self, mock_http):
+        """Should report failure when Discord still rejects after retries."""
+        mock_http.request.return_value = MagicMock(status=429)
+        
+        result = _send_sync("https://discord.com/api/webhooks/test", {"embeds": []}, False)
+        
+        assert result is False
+    
+    @patch('notification._ensure_worker')
+    def test_drop_when_queue_full(self, mock_worker, monkeypatch):
+        """Should drop the notification instead of blocking the backup."""
+        monkeypatch.setattr(notification, '_queue', queue.Queue(maxsize=1))
+        notification._queue.put_nowait(None)
         
         result = send_discord_notification(
             webhook_url="https://discord.com/api/webhooks/test",
-            success=False,
+            success=True,
             database="testdb",
-            error_message="Test error",
-            error_step="Test step",
         )
         
         assert result is False
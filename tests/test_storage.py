@@ -3,12 +3,17 @@ Tests for storage module.
 """
 
 import os
+from dataclasses import replace
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
 import pytest
 
-from storage import ensure_backup_dir, cleanup_old_backups, upload_to_remote
+import storage
+from storage import (
+    ensure_backup_dir, cleanup_old_backups, upload_to_remote,
+    upload_stream_to_remote, delete_from_remote, remote_prefix,
+)
 
 
 class TestEnsureBackupDir:
@@ -51,6 +56,49 @@ class TestCleanupOldBackups:
         
         assert not old_file.exists()
 
+    def test_cleanup_deletes_old_directory_archives(self, tmp_path):
+        """Test that old directory-format (.tar.gz) backups are deleted too."""
+        old_file = tmp_path / "old_backup.tar.gz"
+        old_file.write_bytes(b"old backup")
+        
+        old_time = (datetime.now() - timedelta(days=10)).timestamp()
+        os.utime(old_file, (old_time, old_time))
+        
+        cleanup_old_backups(str(tmp_path), retention_days=7)
+        
+        assert not old_file.exists()
+
+    def test_cleanup_deletes_many_old_files(self, tmp_path):
+        """Test that every expired file is removed by the parallel cleanup."""
+        old_time = (datetime.now() - timedelta(days=10)).timestamp()
+        old_files = []
+        for i in range(20):
+            old_file = tmp_path / f"backup_{i}.sql.gz"
+            old_file.write_bytes(b"old backup")
+            os.utime(old_file, (old_time, old_time))
+            old_files.append(old_file)
+        
+        cleanup_old_backups(str(tmp_path), retention_days=7)
+        
+        assert not any(f.exists() for f in old_files)
+
+    def test_parallel_cleanup_matches_serial(self, tmp_path):
+        """Test that PARALLEL_CLEANUP deletes exactly the expired files."""
+        old_time = (datetime.now() - timedelta(days=10)).timestamp()
+        old_files = []
+        for i in range(5):
+            old_file = tmp_path / f"old_{i}.sql.gz"
+            old_file.write_bytes(b"old backup")
+            os.utime(old_file, (old_time, old_time))
+            old_files.append(old_file)
+        new_file = tmp_path / "new.sql.gz"
+        new_file.write_bytes(b"new backup")
+        
+        cleanup_old_backups(str(tmp_path), retention_days=7, parallel_cleanup=True)
+        
+        assert not any(f.exists() for f in old_files)
+        assert new_file.exists()
+
     def test_cleanup_keeps_new_files(self, tmp_path):
         """Test that recent files are not deleted."""
         # Create a new backup file (today)
@@ -76,6 +124,40 @@ class TestCleanupOldBackups:
         # File should still exist (retention disabled)
         assert test_file.exists()
 
+    def test_cleanup_removes_checksum_sidecars(self, tmp_path):
+        """Test that checksums of expired or missing archives are removed."""
+        old_time = (datetime.now() - timedelta(days=10)).timestamp()
+        old_file = tmp_path / "backup_old.sql.gz"
+        old_file.write_bytes(b"old")
+        os.utime(old_file, (old_time, old_time))
+        (tmp_path / "backup_old.sql.gz.sha256").write_text("hash  backup_old.sql.gz\n")
+        (tmp_path / "backup_gone.sql.gz.xxh64").write_text("hash  backup_gone.sql.gz\n")
+        (tmp_path / "backup_new.sql.gz").write_bytes(b"new")
+        (tmp_path / "backup_new.sql.gz.sha256").write_text("hash  backup_new.sql.gz\n")
+        
+        cleanup_old_backups(str(tmp_path), retention_days=7)
+        
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "backup_new.sql.gz", "backup_new.sql.gz.sha256",
+        ]
+
+    @patch('storage.subprocess.Popen')
+    def test_async_cleanup_hands_large_batch_to_rm(self, mock_popen, tmp_path):
+        """Test that ASYNC_CLEANUP passes large batches to a detached rm."""
+        old_time = (datetime.now() - timedelta(days=10)).timestamp()
+        for i in range(storage.ASYNC_CLEANUP_THRESHOLD):
+            old_file = tmp_path / f"backup_{i:03d}.sql.gz"
+            old_file.write_bytes(b"old")
+            os.utime(old_file, (old_time, old_time))
+        
+        cleanup_old_backups(str(tmp_path), retention_days=7, async_cleanup=True)
+        
+        mock_popen.assert_called_once()
+        cmd = mock_popen.call_args.args[0]
+        assert cmd[:3] == ['rm', '-f', '--']
+        assert len(cmd) == 3 + storage.ASYNC_CLEANUP_THRESHOLD
+        assert mock_popen.call_args.kwargs['start_new_session'] is True
+
     def test_cleanup_ignores_non_gz_files(self, tmp_path):
         """Test that only .sql.gz files are cleaned up."""
         # Create non-gz file
@@ -95,7 +177,14 @@ class TestCleanupOldBackups:
 class TestUploadToRemote:
     """Tests for upload_to_remote function."""
 
-    @patch('storage.boto3.client')
+    @pytest.fixture(autouse=True)
+    def reset_s3_client(self):
+        """Drop the cached S3 client so each test gets its own mock."""
+        storage._create_s3_client.cache_clear()
+        yield
+        storage._create_s3_client.cache_clear()
+
+    @patch('boto3.client')
     def test_upload_to_remote_success(self, mock_boto_client, tmp_path, mock_config):
         """Test successful upload to S3."""
         # Create test file
@@ -108,10 +197,13 @@ class TestUploadToRemote:
         
         upload_to_remote(str(test_file), mock_config)
         
-        # Verify upload_file was called
-        mock_s3.upload_file.assert_called_once()
+        # Verify upload_fileobj was called with multipart settings
+        mock_s3.upload_fileobj.assert_called_once()
+        transfer_config = mock_s3.upload_fileobj.call_args.kwargs['Config']
+        assert transfer_config.max_concurrency == mock_config.s3_concurrency
+        assert transfer_config.multipart_threshold == storage.MULTIPART_THRESHOLD
 
-    @patch('storage.boto3.client')
+    @patch('boto3.client')
     def test_upload_to_remote_error(self, mock_boto_client, tmp_path, mock_config):
         """Test that exception is raised on upload failure."""
         test_file = tmp_path / "backup.sql.gz"
@@ -119,8 +211,106 @@ class TestUploadToRemote:
         
         # Mock S3 client to raise error
         mock_s3 = MagicMock()
-        mock_s3.upload_file.side_effect = Exception("S3 error")
+        mock_s3.upload_fileobj.side_effect = Exception("S3 error")
         mock_boto_client.return_value = mock_s3
         
         with pytest.raises(Exception, match="S3 error"):
             upload_to_remote(str(test_file), mock_config)
+
+    @patch('boto3.client')
+    def test_upload_to_remote_reuses_client(self, mock_boto_client, tmp_path, mock_config):
+        """Test that consecutive uploads share one S3 client."""
+        test_file = tmp_path / "backup.sql.gz"
+        test_file.write_bytes(b"backup content")
+        checksum_file = tmp_path / "backup.sql.gz.sha256"
+        checksum_file.write_text("hash  backup.sql.gz\n")
+        mock_s3 = MagicMock()
+        mock_boto_client.return_value = mock_s3
+        
+        upload_to_remote(str(test_file), mock_config)
+        upload_to_remote(str(checksum_file), mock_config)
+        
+        mock_boto_client.assert_called_once()
+        assert mock_s3.upload_fileobj.call_count == 2
+
+    @patch('boto3.client')
+    def test_new_credentials_get_new_client(self, mock_boto_client, tmp_path, mock_config):
+        """Test that the client cache is keyed by endpoint and credentials."""
+        test_file = tmp_path / "backup.sql.gz"
+        test_file.write_bytes(b"backup content")
+        
+        upload_to_remote(str(test_file), mock_config)
+        upload_to_remote(str(test_file), replace(mock_config, remote_access_key='other'))
+        
+        assert mock_boto_client.call_count == 2
+        client_config = mock_boto_client.call_args.kwargs['config']
+        assert client_config.retries['mode'] == 'adaptive'
+        assert client_config.max_pool_connections > mock_config.s3_concurrency
+        assert client_config.tcp_keepalive is True
+
+    @patch('boto3.client')
+    def test_upload_uses_given_prefix(self, mock_boto_client, tmp_path, mock_config):
+        """Test that the key prefix computed from the start time is used."""
+        test_file = tmp_path / "backup.sql.gz"
+        test_file.write_bytes(b"backup content")
+        mock_s3 = MagicMock()
+        mock_boto_client.return_value = mock_s3
+        
+        prefix = remote_prefix(mock_config, datetime(2025, 12, 31, 23, 59, 59))
+        upload_to_remote(str(test_file), mock_config, prefix)
+        
+        assert mock_s3.upload_fileobj.call_args.args[2] == "2025-12/backup.sql.gz"
+
+    @pytest.mark.parametrize('path_format, expected', [
+        ('daily', '2025-12-31'),
+        ('flat', ''),
+    ])
+    def test_remote_prefix_formats(self, path_format, expected, mock_config):
+        """Test the prefix for the other REMOTE_PATH_FORMAT values."""
+        config = replace(mock_config, remote_path_format=path_format)
+        
+        assert remote_prefix(config, datetime(2025, 12, 31, 23, 59, 59)) == expected
+
+    @patch('boto3.client')
+    def test_upload_stream_to_remote(self, mock_boto_client, mock_config):
+        """Test that a stream is uploaded with upload_fileobj under the dated prefix."""
+        mock_s3 = MagicMock()
+        mock_boto_client.return_value = mock_s3
+        stream = MagicMock()
+        
+        prefix = remote_prefix(mock_config, datetime(2025, 12, 31, 23, 59, 59))
+        
+        upload_stream_to_remote(stream, "backup.sql.gz", mock_config, prefix)
+        
+        args = mock_s3.upload_fileobj.call_args.args
+        assert args[0] is stream
+        assert args[1] == mock_config.remote_bucket
+        assert args[2] == "2025-12/backup.sql.gz"
+
+    @patch('boto3.client')
+    def test_pipe_upload_bounds_buffered_parts(self, mock_boto_client, mock_config):
+        """Test that a non-seekable stream gets small parts and few buffered chunks."""
+        mock_s3 = MagicMock()
+        mock_boto_client.return_value = mock_s3
+        read_fd, write_fd = os.pipe()
+        os.close(write_fd)
+        
+        with open(read_fd, 'rb') as pipe:
+            upload_stream_to_remote(pipe, "backup.sql.gz", mock_config)
+        
+        transfer_config = mock_s3.upload_fileobj.call_args.kwargs['Config']
+        assert transfer_config.multipart_chunksize == storage.STREAM_CHUNK_SIZE
+        assert transfer_config.max_in_memory_upload_chunks == storage.STREAM_BUFFERED_CHUNKS
+        assert transfer_config.max_concurrency <= storage.STREAM_BUFFERED_CHUNKS
+
+    @patch('boto3.client')
+    def test_delete_from_remote_swallows_errors(self, mock_boto_client, mock_config):
+        """Test that a failed delete is logged, not raised."""
+        mock_s3 = MagicMock()
+        mock_s3.delete_object.side_effect = Exception("S3 error")
+        mock_boto_client.return_value = mock_s3
+        
+        # Should not raise
+        delete_from_remote("backup.sql.gz", mock_config)
+        
+        mock_s3.delete_object.assert_called_once()